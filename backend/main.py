@@ -1,22 +1,32 @@
+import asyncio
 import os
 from contextlib import asynccontextmanager
 from dotenv import load_dotenv
-from fastapi import FastAPI, HTTPException
+from fastapi import BackgroundTasks, FastAPI, HTTPException, Query, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from typing import Optional
-import json
+import logging
+import orjson
 
-from models.database import init_db, get_db
+from models.database import init_db, create_pool
+from services.http_client import close_http_clients
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    """Initialize database on startup."""
+    """Initialize database and connection pool on startup."""
     await init_db()
+    app.state.db_pool = create_pool()
     yield
+    # Provider HTTP clients are created on first use and live until shutdown
+    await close_http_clients()
+    await app.state.db_pool.close()
 
 
 app = FastAPI(title="Grasp API", version="1.0.0", lifespan=lifespan)
@@ -41,6 +51,7 @@ class VideoResponse(BaseModel):
     title: str
     duration: int
     chunk_count: int
+    status: str
 
 
 class ChatMessageRequest(BaseModel):
@@ -84,136 +95,292 @@ async def health_check():
 
 
 # Video endpoints
-@app.post("/api/video/load", response_model=VideoResponse)
-async def load_video(request: VideoLoadRequest):
-    from services.youtube_service import extract_video_data
+# Videos with an indexing task in flight in this process
+indexing_videos: set[str] = set()
+
+
+def indexing_status(video_id: str, indexed: int) -> str:
+    """Describe a video's indexing state: ready, indexing or failed."""
+    if indexed == 1:
+        return "ready"
+    if indexed == -1 and video_id not in indexing_videos:
+        return "failed"
+    return "indexing"
+
+
+def schedule_indexing(
+    background_tasks: BackgroundTasks,
+    video_id: str,
+    chunks: list[dict]
+) -> None:
+    """Mark a video as being indexed and index it after responding."""
+    indexing_videos.add(video_id)
+    background_tasks.add_task(index_video, video_id, chunks)
+
+
+async def fetch_stored_chunks(db, video_id: str) -> list[dict]:
+    """Fetch the stored transcript chunks of a video for re-indexing."""
+    cursor = await db.execute(
+        """SELECT start_time, end_time, text FROM chunks
+           WHERE video_id = ? ORDER BY chunk_index""",
+        (video_id,)
+    )
+    return [dict(c) for c in await cursor.fetchall()]
+
+
+async def index_video(video_id: str, chunks: list[dict]) -> None:
+    """Generate embeddings, store them in the vector DB and mark the video indexed.
+
+    A failed attempt marks the video with indexed = -1 so it can be retried.
+    """
     from services.embedding_service import embed_chunks
     from vector_store.chroma_manager import store_chunks
 
+    indexing_videos.add(video_id)
+    try:
+        embeddings = await embed_chunks(video_id, chunks, app.state.db_pool)
+        await store_chunks(video_id, chunks, embeddings)
+
+        async with app.state.db_pool.connection() as db:
+            await db.execute("UPDATE videos SET indexed = 1 WHERE id = ?", (video_id,))
+            await db.commit()
+    except Exception as e:
+        logger.error(f"Error indexing video {video_id}: {e}")
+        async with app.state.db_pool.connection() as db:
+            await db.execute("UPDATE videos SET indexed = -1 WHERE id = ?", (video_id,))
+            await db.commit()
+    finally:
+        indexing_videos.discard(video_id)
+
+
+@app.post("/api/video/load", response_model=VideoResponse, status_code=202)
+async def load_video(
+    request: VideoLoadRequest,
+    background_tasks: BackgroundTasks,
+    response: Response
+):
+    from services.youtube_service import extract_video_data
+
     video_data = await extract_video_data(request.url)
     if not video_data:
         raise HTTPException(status_code=400, detail="Failed to extract video data")
 
-    db = await get_db()
-
-    # Check if video already exists
-    cursor = await db.execute(
-        "SELECT id FROM videos WHERE youtube_id = ?",
-        (video_data["youtube_id"],)
-    )
-    existing = await cursor.fetchone()
-
-    if existing:
-        await db.close()
-        cursor = await (await get_db()).execute(
-            "SELECT COUNT(*) as count FROM chunks WHERE video_id = ?",
-            (existing["id"],)
+    async with app.state.db_pool.connection() as db:
+        # Check if video already exists, counting its chunks in the same query
+        cursor = await db.execute(
+            """SELECT v.id, v.indexed,
+                      (SELECT COUNT(*) FROM chunks WHERE video_id = v.id) AS chunk_count
+               FROM videos v WHERE v.youtube_id = ?""",
+            (video_data["youtube_id"],)
         )
-        count = await cursor.fetchone()
-        return VideoResponse(
-            id=existing["id"],
-            youtube_id=video_data["youtube_id"],
-            title=video_data["title"],
-            duration=video_data["duration"],
-            chunk_count=count["count"]
+        existing = await cursor.fetchone()
+
+        if existing:
+            if existing["indexed"] == 1:
+                response.status_code = 200
+            elif existing["id"] not in indexing_videos:
+                # A previous indexing attempt failed or was lost, so retry it
+                chunks = await fetch_stored_chunks(db, existing["id"])
+                schedule_indexing(background_tasks, existing["id"], chunks)
+
+            return VideoResponse(
+                id=existing["id"],
+                youtube_id=video_data["youtube_id"],
+                title=video_data["title"],
+                duration=video_data["duration"],
+                chunk_count=existing["chunk_count"],
+                status="ready" if existing["indexed"] == 1 else "indexing"
+            )
+
+        # Store video
+        video_id = video_data["youtube_id"]
+        await db.execute(
+            """INSERT INTO videos (id, youtube_id, title, duration, transcript)
+               VALUES (?, ?, ?, ?, ?)""",
+            (video_id, video_data["youtube_id"], video_data["title"],
+             video_data["duration"], video_data["transcript"])
         )
 
-    # Store video
-    video_id = video_data["youtube_id"]
-    await db.execute(
-        """INSERT INTO videos (id, youtube_id, title, duration, transcript)
-           VALUES (?, ?, ?, ?, ?)""",
-        (video_id, video_data["youtube_id"], video_data["title"],
-         video_data["duration"], video_data["transcript"])
-    )
-
-    # Store chunks
-    for i, chunk in enumerate(video_data["chunks"]):
-        await db.execute(
+        # Store chunks
+        await db.executemany(
             """INSERT INTO chunks (video_id, chunk_index, start_time, end_time, text)
                VALUES (?, ?, ?, ?, ?)""",
-            (video_id, i, chunk["start_time"], chunk["end_time"], chunk["text"])
+            [
+                (video_id, i, chunk["start_time"], chunk["end_time"], chunk["text"])
+                for i, chunk in enumerate(video_data["chunks"])
+            ]
         )
 
-    await db.commit()
-    await db.close()
+        await db.commit()
 
-    # Generate embeddings and store in vector DB
-    await embed_chunks(video_id, video_data["chunks"])
-    await store_chunks(video_id, video_data["chunks"])
+    # Generate embeddings and store in vector DB after responding
+    schedule_indexing(background_tasks, video_id, video_data["chunks"])
 
     return VideoResponse(
         id=video_id,
         youtube_id=video_data["youtube_id"],
         title=video_data["title"],
         duration=video_data["duration"],
-        chunk_count=len(video_data["chunks"])
+        chunk_count=len(video_data["chunks"]),
+        status="indexing"
     )
 
 
 @app.get("/api/video/{video_id}")
 async def get_video(video_id: str):
-    db = await get_db()
-    cursor = await db.execute(
-        "SELECT * FROM videos WHERE id = ?", (video_id,)
-    )
-    video = await cursor.fetchone()
-    await db.close()
+    async with app.state.db_pool.connection() as db:
+        cursor = await db.execute(
+            "SELECT * FROM videos WHERE id = ?", (video_id,)
+        )
+        video = await cursor.fetchone()
 
     if not video:
         raise HTTPException(status_code=404, detail="Video not found")
 
-    return dict(video)
+    return {**dict(video), "status": indexing_status(video_id, video["indexed"])}
+
+
+@app.get("/api/video/{video_id}/status")
+async def get_video_status(video_id: str, background_tasks: BackgroundTasks):
+    """Report a video's indexing state without sending its transcript."""
+    async with app.state.db_pool.connection() as db:
+        cursor = await db.execute(
+            "SELECT indexed FROM videos WHERE id = ?", (video_id,)
+        )
+        video = await cursor.fetchone()
+        if not video:
+            raise HTTPException(status_code=404, detail="Video not found")
+
+        # An unindexed video with no task in flight lost it, e.g. to a restart
+        if video["indexed"] == 0 and video_id not in indexing_videos:
+            chunks = await fetch_stored_chunks(db, video_id)
+            schedule_indexing(background_tasks, video_id, chunks)
+
+    return {"id": video_id, "status": indexing_status(video_id, video["indexed"])}
+
+
+@app.post("/api/video/{video_id}/index", status_code=202)
+async def retry_video_indexing(
+    video_id: str,
+    background_tasks: BackgroundTasks,
+    response: Response
+):
+    """Index a video again, e.g. after a failed attempt."""
+    async with app.state.db_pool.connection() as db:
+        cursor = await db.execute(
+            "SELECT indexed FROM videos WHERE id = ?", (video_id,)
+        )
+        video = await cursor.fetchone()
+        if not video:
+            raise HTTPException(status_code=404, detail="Video not found")
+
+        if video["indexed"] == 1:
+            response.status_code = 200
+            return {"id": video_id, "status": "ready"}
+
+        if video_id not in indexing_videos:
+            chunks = await fetch_stored_chunks(db, video_id)
+            schedule_indexing(background_tasks, video_id, chunks)
+
+    return {"id": video_id, "status": "indexing"}
 
 
 @app.get("/api/videos")
 async def list_videos():
-    db = await get_db()
-    cursor = await db.execute(
-        "SELECT id, youtube_id, title, duration, processed_at FROM videos ORDER BY processed_at DESC"
-    )
-    videos = await cursor.fetchall()
-    await db.close()
+    async with app.state.db_pool.connection() as db:
+        cursor = await db.execute(
+            "SELECT id, youtube_id, title, duration, processed_at FROM videos ORDER BY processed_at DESC"
+        )
+        videos = await cursor.fetchall()
     return [dict(v) for v in videos]
 
 
 # Chat endpoints
-@app.post("/api/chat/message", response_model=ChatMessageResponse)
-async def send_chat_message(request: ChatMessageRequest):
-    from services.llm_service import get_chat_response
+async def build_chat_context(request: ChatMessageRequest) -> tuple[list[dict], str]:
+    """Retrieve context chunks and the video title for a chat message."""
     from services.embedding_service import embed_text
     from vector_store.chroma_manager import query_similar_chunks
 
-    # Get relevant chunks via RAG
-    question_embedding = await embed_text(request.message)
-    similar_chunks = await query_similar_chunks(
-        request.video_id,
-        question_embedding,
-        n_results=5
-    )
+    async def find_similar_chunks() -> list[dict]:
+        # Get relevant chunks via RAG
+        question_embedding = await embed_text(request.message, app.state.db_pool)
+        return await query_similar_chunks(
+            request.video_id,
+            question_embedding,
+            n_results=5
+        )
 
-    # Get chunks near current timestamp
-    db = await get_db()
-    cursor = await db.execute(
-        """SELECT * FROM chunks
-           WHERE video_id = ? AND start_time >= ? AND end_time <= ?
-           ORDER BY start_time""",
-        (request.video_id,
-         max(0, request.current_timestamp - 120),
-         request.current_timestamp + 120)
-    )
-    timestamp_chunks = await cursor.fetchall()
-    timestamp_chunks = [dict(c) for c in timestamp_chunks]
+    async def fetch_timestamp_chunks() -> list[dict]:
+        # Get chunks near current timestamp
+        async with app.state.db_pool.connection() as db:
+            cursor = await db.execute(
+                """SELECT * FROM chunks
+                   WHERE video_id = ? AND start_time >= ? AND end_time <= ?
+                   ORDER BY start_time""",
+                (request.video_id,
+                 max(0, request.current_timestamp - 120),
+                 request.current_timestamp + 120)
+            )
+            return [dict(c) for c in await cursor.fetchall()]
 
     # Get video info
-    cursor = await db.execute(
-        "SELECT title FROM videos WHERE id = ?", (request.video_id,)
-    )
-    video = await cursor.fetchone()
+    async with app.state.db_pool.connection() as db:
+        cursor = await db.execute(
+            "SELECT title, indexed FROM videos WHERE id = ?", (request.video_id,)
+        )
+        video = await cursor.fetchone()
+
+    if video:
+        status = indexing_status(request.video_id, video["indexed"])
+        if status == "failed":
+            raise HTTPException(status_code=409, detail="Video indexing failed")
+        if status == "indexing":
+            raise HTTPException(status_code=409, detail="Video is still being indexed")
     video_title = video["title"] if video else "Unknown Video"
 
-    # Combine context
-    context_chunks = similar_chunks + [c for c in timestamp_chunks if c not in similar_chunks]
+    # Retrieval steps are independent, so run them concurrently
+    similar_chunks, timestamp_chunks = await asyncio.gather(
+        find_similar_chunks(),
+        fetch_timestamp_chunks(),
+    )
+
+    # Combine context, skipping timestamp chunks already found by similarity
+    seen = {c["chunk_index"] for c in similar_chunks}
+    context_chunks = similar_chunks + [
+        c for c in timestamp_chunks if c["chunk_index"] not in seen
+    ]
+    return context_chunks, video_title
+
+
+async def store_chat_messages(
+    request: ChatMessageRequest,
+    response: str,
+    context_chunks: list[dict]
+) -> None:
+    """Store the user message and assistant response in chat history."""
+    context_json = orjson.dumps(
+        [c.get("id") or c.get("chunk_index") for c in context_chunks]
+    ).decode()
+
+    async with app.state.db_pool.connection() as db:
+        await db.executemany(
+            """INSERT INTO messages (video_id, timestamp, role, content, context_chunks)
+               VALUES (?, ?, ?, ?, ?)""",
+            [
+                (request.video_id, request.current_timestamp, "user",
+                 request.message, context_json),
+                (request.video_id, request.current_timestamp, "assistant",
+                 response, context_json),
+            ]
+        )
+        await db.commit()
+
+
+@app.post("/api/chat/message", response_model=ChatMessageResponse)
+async def send_chat_message(request: ChatMessageRequest):
+    from services.llm_service import get_chat_response
+
+    context_chunks, video_title = await build_chat_context(request)
 
     # Get Claude response
     response = await get_chat_response(
@@ -223,21 +390,7 @@ async def send_chat_message(request: ChatMessageRequest):
         current_timestamp=request.current_timestamp
     )
 
-    # Store messages
-    await db.execute(
-        """INSERT INTO messages (video_id, timestamp, role, content, context_chunks)
-           VALUES (?, ?, 'user', ?, ?)""",
-        (request.video_id, request.current_timestamp, request.message,
-         json.dumps([c.get("id") or c.get("chunk_index") for c in context_chunks]))
-    )
-    await db.execute(
-        """INSERT INTO messages (video_id, timestamp, role, content, context_chunks)
-           VALUES (?, ?, 'assistant', ?, ?)""",
-        (request.video_id, request.current_timestamp, response,
-         json.dumps([c.get("id") or c.get("chunk_index") for c in context_chunks]))
-    )
-    await db.commit()
-    await db.close()
+    await store_chat_messages(request, response, context_chunks)
 
     return ChatMessageResponse(
         role="assistant",
@@ -246,54 +399,116 @@ async def send_chat_message(request: ChatMessageRequest):
     )
 
 
-@app.get("/api/chat/history/{video_id}")
-async def get_chat_history(video_id: str):
-    db = await get_db()
-    cursor = await db.execute(
-        """SELECT * FROM messages WHERE video_id = ? ORDER BY created_at""",
-        (video_id,)
+@app.post("/api/chat/stream")
+async def stream_chat_message(request: ChatMessageRequest):
+    """Stream the assistant response as Server-Sent Events."""
+    from services.llm_service import stream_chat_response
+
+    context_chunks, video_title = await build_chat_context(request)
+
+    stream = stream_chat_response(
+        question=request.message,
+        context_chunks=context_chunks,
+        video_title=video_title,
+        current_timestamp=request.current_timestamp
     )
-    messages = await cursor.fetchall()
-    await db.close()
+
+    # Wait for the first chunk so provider errors fail the request with a
+    # status code instead of an empty 200 stream
+    try:
+        first = await anext(stream)
+    except StopAsyncIteration:
+        first = None
+    except Exception:
+        raise HTTPException(status_code=500, detail="LLM API error")
+
+    async def event_generator():
+        parts = []
+        text = first
+        try:
+            while text is not None:
+                parts.append(text)
+                yield f"data: {orjson.dumps({'content': text}).decode()}\n\n"
+                text = await anext(stream, None)
+        except Exception:
+            yield f"event: error\ndata: {orjson.dumps({'detail': 'LLM API error'}).decode()}\n\n"
+            return
+
+        # Only a completed response is stored in chat history
+        await store_chat_messages(request, "".join(parts), context_chunks)
+        yield f"event: done\ndata: {orjson.dumps({'context_chunks': context_chunks}).decode()}\n\n"
+
+    return StreamingResponse(event_generator(), media_type="text/event-stream")
+
+
+async def fetch_recent_messages(video_id: str, limit: int) -> list[dict]:
+    """Fetch the last `limit` chat messages for a video, oldest first."""
+    async with app.state.db_pool.connection() as db:
+        cursor = await db.execute(
+            """SELECT * FROM messages WHERE video_id = ?
+               ORDER BY created_at DESC, id DESC LIMIT ?""",
+            (video_id, limit)
+        )
+        messages = await cursor.fetchall()
+    return [dict(m) for m in reversed(messages)]
+
+
+@app.get("/api/chat/history/{video_id}")
+async def get_chat_history(video_id: str, limit: Optional[int] = Query(None, ge=1)):
+    if limit is not None:
+        return await fetch_recent_messages(video_id, limit)
+
+    async with app.state.db_pool.connection() as db:
+        cursor = await db.execute(
+            """SELECT * FROM messages WHERE video_id = ? ORDER BY created_at""",
+            (video_id,)
+        )
+        messages = await cursor.fetchall()
     return [dict(m) for m in messages]
 
 
 # Notes endpoints
 @app.post("/api/notes", response_model=NoteResponse)
 async def create_note(note: NoteCreate):
-    db = await get_db()
-    cursor = await db.execute(
-        """INSERT INTO notes (video_id, timestamp, content, tags)
-           VALUES (?, ?, ?, ?)""",
-        (note.video_id, note.timestamp, note.content, json.dumps(note.tags))
-    )
-    note_id = cursor.lastrowid
-    await db.commit()
+    async with app.state.db_pool.connection() as db:
+        cursor = await db.execute(
+            """INSERT INTO notes (video_id, timestamp, content, tags)
+               VALUES (?, ?, ?, ?)""",
+            (note.video_id, note.timestamp, note.content, orjson.dumps(note.tags).decode())
+        )
+        note_id = cursor.lastrowid
+        await db.commit()
 
-    cursor = await db.execute("SELECT * FROM notes WHERE id = ?", (note_id,))
-    created_note = await cursor.fetchone()
-    await db.close()
+        cursor = await db.execute("SELECT * FROM notes WHERE id = ?", (note_id,))
+        created_note = await cursor.fetchone()
 
     return NoteResponse(
         id=created_note["id"],
         video_id=created_note["video_id"],
         timestamp=created_note["timestamp"],
         content=created_note["content"],
-        tags=json.loads(created_note["tags"]) if created_note["tags"] else [],
+        tags=orjson.loads(created_note["tags"]) if created_note["tags"] else [],
         created_at=str(created_note["created_at"]),
         updated_at=str(created_note["updated_at"])
     )
 
 
-@app.get("/api/notes/{video_id}")
-async def get_notes(video_id: str):
-    db = await get_db()
-    cursor = await db.execute(
-        """SELECT * FROM notes WHERE video_id = ? ORDER BY timestamp""",
-        (video_id,)
-    )
-    notes = await cursor.fetchall()
-    await db.close()
+@app.get("/api/notes/{video_id}", response_model=list[NoteResponse])
+async def get_notes(video_id: str, tag: Optional[str] = None):
+    async with app.state.db_pool.connection() as db:
+        if tag is None:
+            cursor = await db.execute(
+                """SELECT * FROM notes WHERE video_id = ? ORDER BY timestamp""",
+                (video_id,)
+            )
+        else:
+            cursor = await db.execute(
+                """SELECT n.* FROM note_tags t JOIN notes n ON n.id = t.note_id
+                   WHERE t.tag = ? AND n.video_id = ?
+                   ORDER BY n.timestamp""",
+                (tag, video_id)
+            )
+        notes = await cursor.fetchall()
 
     return [
         NoteResponse(
@@ -301,7 +516,7 @@ async def get_notes(video_id: str):
             video_id=n["video_id"],
             timestamp=n["timestamp"],
             content=n["content"],
-            tags=json.loads(n["tags"]) if n["tags"] else [],
+            tags=orjson.loads(n["tags"]) if n["tags"] else [],
             created_at=str(n["created_at"]),
             updated_at=str(n["updated_at"])
         )
@@ -311,36 +526,33 @@ async def get_notes(video_id: str):
 
 @app.put("/api/notes/{note_id}", response_model=NoteResponse)
 async def update_note(note_id: int, note: NoteUpdate):
-    db = await get_db()
-
-    # Get existing note
-    cursor = await db.execute("SELECT * FROM notes WHERE id = ?", (note_id,))
-    existing = await cursor.fetchone()
-    if not existing:
-        await db.close()
-        raise HTTPException(status_code=404, detail="Note not found")
-
-    # Update fields
-    content = note.content if note.content is not None else existing["content"]
-    tags = json.dumps(note.tags) if note.tags is not None else existing["tags"]
-
-    await db.execute(
-        """UPDATE notes SET content = ?, tags = ?, updated_at = CURRENT_TIMESTAMP
-           WHERE id = ?""",
-        (content, tags, note_id)
-    )
-    await db.commit()
+    async with app.state.db_pool.connection() as db:
+        # Get existing note
+        cursor = await db.execute("SELECT * FROM notes WHERE id = ?", (note_id,))
+        existing = await cursor.fetchone()
+        if not existing:
+            raise HTTPException(status_code=404, detail="Note not found")
 
-    cursor = await db.execute("SELECT * FROM notes WHERE id = ?", (note_id,))
-    updated = await cursor.fetchone()
-    await db.close()
+        # Update fields
+        content = note.content if note.content is not None else existing["content"]
+        tags = orjson.dumps(note.tags).decode() if note.tags is not None else existing["tags"]
+
+        await db.execute(
+            """UPDATE notes SET content = ?, tags = ?, updated_at = CURRENT_TIMESTAMP
+               WHERE id = ?""",
+            (content, tags, note_id)
+        )
+        await db.commit()
+
+        cursor = await db.execute("SELECT * FROM notes WHERE id = ?", (note_id,))
+        updated = await cursor.fetchone()
 
     return NoteResponse(
         id=updated["id"],
         video_id=updated["video_id"],
         timestamp=updated["timestamp"],
         content=updated["content"],
-        tags=json.loads(updated["tags"]) if updated["tags"] else [],
+        tags=orjson.loads(updated["tags"]) if updated["tags"] else [],
         created_at=str(updated["created_at"]),
         updated_at=str(updated["updated_at"])
     )
@@ -348,15 +560,13 @@ async def update_note(note_id: int, note: NoteUpdate):
 
 @app.delete("/api/notes/{note_id}")
 async def delete_note(note_id: int):
-    db = await get_db()
-    cursor = await db.execute("SELECT id FROM notes WHERE id = ?", (note_id,))
-    if not await cursor.fetchone():
-        await db.close()
-        raise HTTPException(status_code=404, detail="Note not found")
-
-    await db.execute("DELETE FROM notes WHERE id = ?", (note_id,))
-    await db.commit()
-    await db.close()
+    async with app.state.db_pool.connection() as db:
+        cursor = await db.execute("SELECT id FROM notes WHERE id = ?", (note_id,))
+        if not await cursor.fetchone():
+            raise HTTPException(status_code=404, detail="Note not found")
+
+        await db.execute("DELETE FROM notes WHERE id = ?", (note_id,))
+        await db.commit()
     return {"status": "deleted"}
 
 
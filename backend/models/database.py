@@ -1,21 +1,49 @@
 import aiosqlite
 import os
 from pathlib import Path
+from aiosqlitepool import SQLiteConnectionPool
 
 DATABASE_PATH = os.getenv("DATABASE_PATH", "./data/learning.db")
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "8"))
 
+# Connection-scoped pragmas, applied once per pooled connection so they
+# persist across reuse. journal_mode is stored in the database file and is
+# set by init_db.
+CONNECTION_PRAGMAS = (
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA mmap_size=268435456",
+    "PRAGMA cache_size=-65536",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA busy_timeout=5000",
+)
 
-async def get_db():
-    """Get database connection."""
+
+async def _connect() -> aiosqlite.Connection:
+    """Open a configured database connection."""
     Path(DATABASE_PATH).parent.mkdir(parents=True, exist_ok=True)
     db = await aiosqlite.connect(DATABASE_PATH)
     db.row_factory = aiosqlite.Row
+    for pragma in CONNECTION_PRAGMAS:
+        await db.execute(pragma)
     return db
 
 
+def create_pool() -> SQLiteConnectionPool:
+    """Create the connection pool shared by all requests."""
+    return SQLiteConnectionPool(_connect, pool_size=DB_POOL_SIZE)
+
+
 async def init_db():
     """Initialize database with schema."""
-    db = await get_db()
+    db = await _connect()
+
+    # WAL lets readers run concurrently with the single writer
+    await db.execute("PRAGMA journal_mode=WAL")
+
+    cursor = await db.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'note_tags'"
+    )
+    has_note_tags = await cursor.fetchone() is not None
 
     await db.executescript("""
         -- Videos table
@@ -26,7 +54,8 @@ async def init_db():
             duration INTEGER,
             transcript TEXT,
             processed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            watched_duration INTEGER DEFAULT 0
+            watched_duration INTEGER DEFAULT 0,
+            indexed INTEGER DEFAULT 0
         );
 
         -- Transcript chunks
@@ -58,12 +87,34 @@ async def init_db():
             video_id TEXT,
             timestamp REAL,
             content TEXT,
-            tags TEXT,
+            tags TEXT CHECK (tags IS NULL OR json_valid(tags)),
             created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
             updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
             FOREIGN KEY (video_id) REFERENCES videos(id)
         );
 
+        -- One row per note tag, derived from notes.tags by the triggers below
+        CREATE TABLE IF NOT EXISTS note_tags (
+            note_id INTEGER,
+            tag TEXT,
+            PRIMARY KEY (note_id, tag)
+        );
+
+        CREATE TRIGGER IF NOT EXISTS notes_tags_insert AFTER INSERT ON notes BEGIN
+            INSERT OR IGNORE INTO note_tags (note_id, tag)
+            SELECT NEW.id, value FROM json_each(NEW.tags) WHERE type = 'text';
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS notes_tags_update AFTER UPDATE OF tags ON notes BEGIN
+            DELETE FROM note_tags WHERE note_id = NEW.id;
+            INSERT OR IGNORE INTO note_tags (note_id, tag)
+            SELECT NEW.id, value FROM json_each(NEW.tags) WHERE type = 'text';
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS notes_tags_delete AFTER DELETE ON notes BEGIN
+            DELETE FROM note_tags WHERE note_id = OLD.id;
+        END;
+
         -- Flashcards
         CREATE TABLE IF NOT EXISTS flashcards (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -100,12 +151,42 @@ async def init_db():
             FOREIGN KEY (video_id) REFERENCES videos(id)
         );
 
-        -- Create indexes for common queries
-        CREATE INDEX IF NOT EXISTS idx_chunks_video_id ON chunks(video_id);
-        CREATE INDEX IF NOT EXISTS idx_messages_video_id ON messages(video_id);
-        CREATE INDEX IF NOT EXISTS idx_notes_video_id ON notes(video_id);
+        -- Embedding cache, keyed by hash of the normalized text
+        CREATE TABLE IF NOT EXISTS embedding_cache (
+            text_hash TEXT,
+            model TEXT,
+            embedding BLOB,
+            PRIMARY KEY (text_hash, model)
+        );
+
+        -- Create indexes for common queries. The composite indexes serve both
+        -- video_id lookups and the ordered/range scans each endpoint runs.
+        CREATE INDEX IF NOT EXISTS idx_chunks_video_start ON chunks(video_id, start_time);
+        CREATE INDEX IF NOT EXISTS idx_messages_video_created ON messages(video_id, created_at);
+        CREATE INDEX IF NOT EXISTS idx_notes_video_timestamp ON notes(video_id, timestamp);
         CREATE INDEX IF NOT EXISTS idx_learning_events_video_id ON learning_events(video_id);
+        CREATE INDEX IF NOT EXISTS idx_note_tags_tag ON note_tags(tag, note_id);
+
+        -- Superseded by the composite indexes above
+        DROP INDEX IF EXISTS idx_chunks_video_id;
+        DROP INDEX IF EXISTS idx_messages_video_id;
+        DROP INDEX IF EXISTS idx_notes_video_id;
     """)
 
+    # Databases created before background indexing lack the indexed column;
+    # their videos were indexed during the load request
+    cursor = await db.execute("PRAGMA table_info(videos)")
+    if "indexed" not in [column["name"] for column in await cursor.fetchall()]:
+        await db.execute("ALTER TABLE videos ADD COLUMN indexed INTEGER DEFAULT 0")
+        await db.execute("UPDATE videos SET indexed = 1")
+
+    # Notes written before note_tags existed have no tag rows yet
+    if not has_note_tags:
+        await db.execute(
+            """INSERT OR IGNORE INTO note_tags (note_id, tag)
+               SELECT notes.id, json_each.value FROM notes, json_each(notes.tags)
+               WHERE json_each.type = 'text'"""
+        )
+
     await db.commit()
     await db.close()
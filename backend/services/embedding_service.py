@@ -1,58 +1,183 @@
 import os
-from openai import OpenAI
-from typing import Optional
+import functools
+import hashlib
+from collections import OrderedDict
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+from typing import Any, Optional
+from aiosqlitepool import SQLiteConnectionPool
+import numpy as np
 import logging
 
+from services.http_client import get_http_client
+
 logger = logging.getLogger(__name__)
 
-client: Optional[OpenAI] = None
+EMBEDDING_MODEL = "text-embedding-3-small"
+
+# Recently used embeddings, keyed by text hash, kept in process
+MEMORY_CACHE_SIZE = 4096
+_memory_cache: "OrderedDict[str, np.ndarray]" = OrderedDict()
+
+# Stay well under SQLite's bound parameter limit when looking up hashes
+_CACHE_QUERY_BATCH = 500
+
+
+@functools.lru_cache(maxsize=1)
+def _build_client(http_client: Any) -> AsyncOpenAI:
+    api_key = os.getenv("OPENAI_API_KEY")
+    if not api_key:
+        raise ValueError("OPENAI_API_KEY environment variable not set")
+    return AsyncOpenAI(api_key=api_key, http_client=http_client)
+
+
+def get_client() -> AsyncOpenAI:
+    """Get or create OpenAI client on the shared HTTP client."""
+    return _build_client(get_http_client(DefaultAsyncHttpxClient))
+
+
+def _text_hash(text: str) -> str:
+    """Hash normalized text for use as a cache key."""
+    return hashlib.sha256(text.strip().lower().encode()).hexdigest()
+
+
+def _normalize(values: list[float]) -> np.ndarray:
+    """Convert an embedding to a unit-length float32 vector."""
+    embedding = np.asarray(values, dtype=np.float32)
+    norm = np.linalg.norm(embedding)
+    return embedding / norm if norm else embedding
+
+
+def _remember(key: str, embedding: np.ndarray) -> None:
+    """Add an embedding to the in-process cache, evicting the oldest entry."""
+    _memory_cache[key] = embedding
+    _memory_cache.move_to_end(key)
+    if len(_memory_cache) > MEMORY_CACHE_SIZE:
+        _memory_cache.popitem(last=False)
+
+
+async def _load_cached(
+    keys: list[str],
+    pool: Optional[SQLiteConnectionPool]
+) -> dict[str, np.ndarray]:
+    """Look up embeddings in memory, then in the persistent cache."""
+    found = {}
+    missing = []
+    for key in keys:
+        embedding = _memory_cache.get(key)
+        if embedding is not None:
+            _memory_cache.move_to_end(key)
+            found[key] = embedding
+        else:
+            missing.append(key)
 
+    if missing and pool is not None:
+        async with pool.connection() as db:
+            for start in range(0, len(missing), _CACHE_QUERY_BATCH):
+                batch = missing[start:start + _CACHE_QUERY_BATCH]
+                placeholders = ", ".join("?" * len(batch))
+                cursor = await db.execute(
+                    f"""SELECT text_hash, embedding FROM embedding_cache
+                        WHERE model = ? AND text_hash IN ({placeholders})""",
+                    (EMBEDDING_MODEL, *batch)
+                )
+                for row in await cursor.fetchall():
+                    embedding = np.frombuffer(row["embedding"], dtype=np.float32)
+                    _remember(row["text_hash"], embedding)
+                    found[row["text_hash"]] = embedding
 
-def get_client() -> OpenAI:
-    """Get or create OpenAI client."""
-    global client
-    if client is None:
-        api_key = os.getenv("OPENAI_API_KEY")
-        if not api_key:
-            raise ValueError("OPENAI_API_KEY environment variable not set")
-        client = OpenAI(api_key=api_key)
-    return client
+    return found
 
 
-async def embed_text(text: str) -> list[float]:
-    """Generate embedding for a single text."""
+async def _store_cached(
+    embeddings: dict[str, np.ndarray],
+    pool: Optional[SQLiteConnectionPool]
+) -> None:
+    """Save freshly generated embeddings to both cache layers."""
+    for key, embedding in embeddings.items():
+        _remember(key, embedding)
+
+    if embeddings and pool is not None:
+        async with pool.connection() as db:
+            await db.executemany(
+                """INSERT OR IGNORE INTO embedding_cache (text_hash, model, embedding)
+                   VALUES (?, ?, ?)""",
+                [
+                    (key, EMBEDDING_MODEL, embedding.tobytes())
+                    for key, embedding in embeddings.items()
+                ]
+            )
+            await db.commit()
+
+
+async def embed_text(
+    text: str,
+    pool: Optional[SQLiteConnectionPool] = None
+) -> np.ndarray:
+    """Generate embedding for a single text, reusing cached results."""
+    key = _text_hash(text)
+    cached = await _load_cached([key], pool)
+    if key in cached:
+        return cached[key]
+
     try:
-        response = get_client().embeddings.create(
-            model="text-embedding-3-small",
+        response = await get_client().embeddings.create(
+            model=EMBEDDING_MODEL,
             input=text
         )
-        return response.data[0].embedding
     except Exception as e:
         logger.error(f"Error generating embedding: {e}")
         raise
 
+    embedding = _normalize(response.data[0].embedding)
+    await _store_cached({key: embedding}, pool)
+    return embedding
 
-async def embed_texts(texts: list[str]) -> list[list[float]]:
-    """Generate embeddings for multiple texts."""
-    try:
-        response = get_client().embeddings.create(
-            model="text-embedding-3-small",
-            input=texts
-        )
-        return [item.embedding for item in response.data]
-    except Exception as e:
-        logger.error(f"Error generating embeddings: {e}")
-        raise
 
+async def embed_texts(
+    texts: list[str],
+    pool: Optional[SQLiteConnectionPool] = None
+) -> list[np.ndarray]:
+    """Generate embeddings for multiple texts, only requesting cache misses."""
+    keys = [_text_hash(text) for text in texts]
+    cached = await _load_cached(keys, pool)
 
-async def embed_chunks(video_id: str, chunks: list[dict]) -> list[list[float]]:
-    """Generate embeddings for video chunks."""
-    texts = [chunk["text"] for chunk in chunks]
-    embeddings = await embed_texts(texts)
+    # Request each distinct uncached text once
+    misses = {}
+    for key, text in zip(keys, texts):
+        if key not in cached and key not in misses:
+            misses[key] = text
+
+    if misses:
+        try:
+            response = await get_client().embeddings.create(
+                model=EMBEDDING_MODEL,
+                input=list(misses.values())
+            )
+        except Exception as e:
+            logger.error(f"Error generating embeddings: {e}")
+            raise
+
+        fresh = {
+            key: _normalize(item.embedding)
+            for key, item in zip(misses, response.data)
+        }
+        await _store_cached(fresh, pool)
+        cached.update(fresh)
 
-    # Store embeddings with chunk metadata
-    for i, chunk in enumerate(chunks):
-        chunk["embedding"] = embeddings[i]
-        chunk["chunk_index"] = i
+    return [cached[key] for key in keys]
 
-    return embeddings
+
+async def embed_chunks(
+    video_id: str,
+    chunks: list[dict],
+    pool: Optional[SQLiteConnectionPool] = None
+) -> np.ndarray:
+    """Generate embeddings for video chunks as an (n_chunks, dim) array.
+
+    Row i holds the unit-normalized embedding for chunks[i], stored as float16
+    to halve the payload sent to the vector store. The chunk dicts are not
+    modified.
+    """
+    texts = [chunk["text"] for chunk in chunks]
+    embeddings = await embed_texts(texts, pool)
+    return np.asarray(embeddings, dtype=np.float16)
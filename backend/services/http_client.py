@@ -0,0 +1,25 @@
+from typing import Any
+
+# One client per client class; the provider SDKs may depend on different httpx
+# packages, so each must be given an instance of its own DefaultAsyncHttpxClient
+# class. Plain httpx.AsyncClient serves our own requests, such as subtitle fetches.
+_clients: dict[type, Any] = {}
+
+
+def get_http_client(client_class: type) -> Any:
+    """Get or create the long-lived HTTP/2 client of the given class.
+
+    Reusing one client keeps TLS sessions and keep-alive connections to the
+    provider API or YouTube open across requests.
+    """
+    client = _clients.get(client_class)
+    if client is None or client.is_closed:
+        client = _clients[client_class] = client_class(http2=True, timeout=60)
+    return client
+
+
+async def close_http_clients() -> None:
+    """Close all provider HTTP clients."""
+    for client in _clients.values():
+        await client.aclose()
+    _clients.clear()
@@ -1,67 +1,81 @@
 import os
-from typing import Optional
+import functools
+from typing import Any, AsyncIterator
 import logging
 
+from services.http_client import get_http_client
+from services.prompts import build_context_text, build_system_prompt, format_timestamp
+
+# Provider SDKs are optional; only the configured provider needs to be installed
+try:
+    from anthropic import AsyncAnthropic
+    from anthropic import DefaultAsyncHttpxClient as AnthropicHttpClient
+except ImportError:  # pragma: no cover
+    AsyncAnthropic = None
+
+try:
+    from openai import AsyncOpenAI
+    from openai import DefaultAsyncHttpxClient as OpenAIHttpClient
+except ImportError:  # pragma: no cover
+    AsyncOpenAI = None
+
+try:
+    import google.generativeai as genai
+except ImportError:  # pragma: no cover
+    genai = None
+
 logger = logging.getLogger(__name__)
 
 # Get provider from environment
 LLM_PROVIDER = os.getenv("LLM_PROVIDER", "openai").lower()
 
 
-def format_timestamp(seconds: float) -> str:
-    """Convert seconds to MM:SS or HH:MM:SS format."""
-    hours = int(seconds // 3600)
-    minutes = int((seconds % 3600) // 60)
-    secs = int(seconds % 60)
+# Clients are built once per long-lived HTTP client so connections are reused
+@functools.lru_cache(maxsize=1)
+def _build_anthropic_client(http_client: Any) -> "AsyncAnthropic":
+    api_key = os.getenv("ANTHROPIC_API_KEY")
+    if not api_key:
+        raise ValueError("ANTHROPIC_API_KEY not set")
 
-    if hours > 0:
-        return f"{hours}:{minutes:02d}:{secs:02d}"
-    return f"{minutes}:{secs:02d}"
+    return AsyncAnthropic(api_key=api_key, http_client=http_client)
 
 
-def build_context_text(chunks: list[dict]) -> str:
-    """Build formatted context text from chunks."""
-    if not chunks:
-        return "No relevant transcript context available."
+def _anthropic_client() -> "AsyncAnthropic":
+    if AsyncAnthropic is None:
+        raise ImportError("anthropic package not installed")
+    return _build_anthropic_client(get_http_client(AnthropicHttpClient))
 
-    context_parts = []
-    for chunk in chunks:
-        start = format_timestamp(chunk.get("start_time", 0))
-        end = format_timestamp(chunk.get("end_time", 0))
-        text = chunk.get("text", "")
-        context_parts.append(f"[{start} - {end}]\n{text}")
 
-    return "\n\n".join(context_parts)
+@functools.lru_cache(maxsize=1)
+def _build_openai_client(http_client: Any) -> "AsyncOpenAI":
+    api_key = os.getenv("OPENAI_API_KEY")
+    if not api_key:
+        raise ValueError("OPENAI_API_KEY not set")
 
+    return AsyncOpenAI(api_key=api_key, http_client=http_client)
 
-SYSTEM_PROMPT = """You are an AI learning assistant helping a student understand video lectures, particularly on machine learning and technical topics.
 
-Context from video transcript:
-{context}
+def _openai_client() -> "AsyncOpenAI":
+    if AsyncOpenAI is None:
+        raise ImportError("openai package not installed")
+    return _build_openai_client(get_http_client(OpenAIHttpClient))
 
-Current timestamp: {current_time}
-Video: {video_title}
 
-Guidelines:
-- Answer the student's question using the video context provided
-- Be technical but clear - explain complex concepts step by step
-- If explaining code, provide examples and walk through the logic
-- If explaining math, break it down into understandable parts
-- Reference specific timestamps when relevant (e.g., "As mentioned at 5:23...")
-- If the context doesn't contain enough information to answer, say so honestly
-- Keep responses focused and concise while being thorough"""
+@functools.lru_cache(maxsize=1)
+def _configure_gemini() -> None:
+    if genai is None:
+        raise ImportError("google-generativeai package not installed")
 
+    api_key = os.getenv("GOOGLE_API_KEY")
+    if not api_key:
+        raise ValueError("GOOGLE_API_KEY not set")
 
-# Anthropic/Claude
-def get_anthropic_response(system_prompt: str, question: str) -> str:
-    from anthropic import Anthropic
+    genai.configure(api_key=api_key)
 
-    api_key = os.getenv("ANTHROPIC_API_KEY")
-    if not api_key:
-        raise ValueError("ANTHROPIC_API_KEY not set")
 
-    client = Anthropic(api_key=api_key)
-    response = client.messages.create(
+# Anthropic/Claude
+async def get_anthropic_response(system_prompt: str, question: str) -> str:
+    response = await _anthropic_client().messages.create(
         model="claude-sonnet-4-20250514",
         max_tokens=2048,
         system=system_prompt,
@@ -71,15 +85,8 @@ def get_anthropic_response(system_prompt: str, question: str) -> str:
 
 
 # OpenAI
-def get_openai_response(system_prompt: str, question: str) -> str:
-    from openai import OpenAI
-
-    api_key = os.getenv("OPENAI_API_KEY")
-    if not api_key:
-        raise ValueError("OPENAI_API_KEY not set")
-
-    client = OpenAI(api_key=api_key)
-    response = client.chat.completions.create(
+async def get_openai_response(system_prompt: str, question: str) -> str:
+    response = await _openai_client().chat.completions.create(
         model="gpt-4o-mini",
         max_tokens=2048,
         messages=[
@@ -91,20 +98,55 @@ def get_openai_response(system_prompt: str, question: str) -> str:
 
 
 # Google Gemini
-def get_gemini_response(system_prompt: str, question: str) -> str:
-    import google.generativeai as genai
+async def get_gemini_response(system_prompt: str, question: str) -> str:
+    # The system prompt embeds per-request context, so only the API
+    # configuration is shared; the model wrapper itself is cheap to build
+    _configure_gemini()
+    model = genai.GenerativeModel(
+        model_name="gemini-1.5-flash",
+        system_instruction=system_prompt
+    )
+    response = await model.generate_content_async(question)
+    return response.text
 
-    api_key = os.getenv("GOOGLE_API_KEY")
-    if not api_key:
-        raise ValueError("GOOGLE_API_KEY not set")
 
-    genai.configure(api_key=api_key)
+# Streaming variants yield the response text incrementally as it arrives
+async def stream_anthropic_response(system_prompt: str, question: str) -> AsyncIterator[str]:
+    async with _anthropic_client().messages.stream(
+        model="claude-sonnet-4-20250514",
+        max_tokens=2048,
+        system=system_prompt,
+        messages=[{"role": "user", "content": question}]
+    ) as stream:
+        async for text in stream.text_stream:
+            yield text
+
+
+async def stream_openai_response(system_prompt: str, question: str) -> AsyncIterator[str]:
+    stream = await _openai_client().chat.completions.create(
+        model="gpt-4o-mini",
+        max_tokens=2048,
+        messages=[
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": question}
+        ],
+        stream=True
+    )
+    async for chunk in stream:
+        if chunk.choices and chunk.choices[0].delta.content:
+            yield chunk.choices[0].delta.content
+
+
+async def stream_gemini_response(system_prompt: str, question: str) -> AsyncIterator[str]:
+    _configure_gemini()
     model = genai.GenerativeModel(
         model_name="gemini-1.5-flash",
         system_instruction=system_prompt
     )
-    response = model.generate_content(question)
-    return response.text
+    response = await model.generate_content_async(question, stream=True)
+    async for chunk in response:
+        if chunk.text:
+            yield chunk.text
 
 
 async def get_chat_response(
@@ -117,25 +159,49 @@ async def get_chat_response(
     context_text = build_context_text(context_chunks)
     current_time = format_timestamp(current_timestamp)
 
-    system_prompt = SYSTEM_PROMPT.format(
-        context=context_text,
-        current_time=current_time,
-        video_title=video_title
-    )
+    system_prompt = build_system_prompt(context_text, current_time, video_title)
 
     try:
         if LLM_PROVIDER == "anthropic" or LLM_PROVIDER == "claude":
-            return get_anthropic_response(system_prompt, question)
+            return await get_anthropic_response(system_prompt, question)
         elif LLM_PROVIDER == "gemini" or LLM_PROVIDER == "google":
-            return get_gemini_response(system_prompt, question)
+            return await get_gemini_response(system_prompt, question)
         else:  # default to openai
-            return get_openai_response(system_prompt, question)
+            return await get_openai_response(system_prompt, question)
 
     except Exception as e:
         logger.error(f"Error getting LLM response ({LLM_PROVIDER}): {e}")
         raise
 
 
+async def stream_chat_response(
+    question: str,
+    context_chunks: list[dict],
+    video_title: str,
+    current_timestamp: float = 0.0
+) -> AsyncIterator[str]:
+    """Stream a response from the configured LLM provider with video context."""
+    context_text = build_context_text(context_chunks)
+    current_time = format_timestamp(current_timestamp)
+
+    system_prompt = build_system_prompt(context_text, current_time, video_title)
+
+    if LLM_PROVIDER == "anthropic" or LLM_PROVIDER == "claude":
+        stream = stream_anthropic_response(system_prompt, question)
+    elif LLM_PROVIDER == "gemini" or LLM_PROVIDER == "google":
+        stream = stream_gemini_response(system_prompt, question)
+    else:  # default to openai
+        stream = stream_openai_response(system_prompt, question)
+
+    try:
+        async for text in stream:
+            yield text
+
+    except Exception as e:
+        logger.error(f"Error streaming LLM response ({LLM_PROVIDER}): {e}")
+        raise
+
+
 async def get_chat_response_with_history(
     question: str,
     context_chunks: list[dict],
@@ -148,11 +214,7 @@ async def get_chat_response_with_history(
     context_text = build_context_text(context_chunks)
     current_time = format_timestamp(current_timestamp)
 
-    system_prompt = SYSTEM_PROMPT.format(
-        context=context_text,
-        current_time=current_time,
-        video_title=video_title
-    )
+    system_prompt = build_system_prompt(context_text, current_time, video_title)
 
     # Build conversation context from history
     history_text = ""
@@ -164,11 +226,11 @@ async def get_chat_response_with_history(
 
     try:
         if LLM_PROVIDER == "anthropic" or LLM_PROVIDER == "claude":
-            return get_anthropic_response(system_prompt, full_question)
+            return await get_anthropic_response(system_prompt, full_question)
         elif LLM_PROVIDER == "gemini" or LLM_PROVIDER == "google":
-            return get_gemini_response(system_prompt, full_question)
+            return await get_gemini_response(system_prompt, full_question)
         else:
-            return get_openai_response(system_prompt, full_question)
+            return await get_openai_response(system_prompt, full_question)
 
     except Exception as e:
         logger.error(f"Error getting LLM response ({LLM_PROVIDER}): {e}")
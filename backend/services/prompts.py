@@ -0,0 +1,59 @@
+"""Prompt construction shared by the chat services."""
+
+
+def format_timestamp(seconds: float) -> str:
+    """Convert seconds to MM:SS or HH:MM:SS format."""
+    total = int(seconds)
+    if total < 3600:
+        minutes, secs = divmod(total, 60)
+        return f"{minutes}:{secs:02d}"
+
+    hours, rest = divmod(total, 3600)
+    minutes, secs = divmod(rest, 60)
+    return f"{hours}:{minutes:02d}:{secs:02d}"
+
+
+def build_context_text(chunks: list[dict]) -> str:
+    """Build formatted context text from chunks."""
+    if not chunks:
+        return "No relevant transcript context available."
+
+    return "\n\n".join([
+        f"[{format_timestamp(chunk.get('start_time', 0))} - "
+        f"{format_timestamp(chunk.get('end_time', 0))}]\n{chunk.get('text', '')}"
+        for chunk in chunks
+    ])
+
+
+SYSTEM_PROMPT = """You are an AI learning assistant helping a student understand video lectures, particularly on machine learning and technical topics.
+
+Context from video transcript:
+{context}
+
+Current timestamp: {current_time}
+Video: {video_title}
+
+Guidelines:
+- Answer the student's question using the video context provided
+- Be technical but clear - explain complex concepts step by step
+- If explaining code, provide examples and walk through the logic
+- If explaining math, break it down into understandable parts
+- Reference specific timestamps when relevant (e.g., "As mentioned at 5:23...")
+- If the context doesn't contain enough information to answer, say so honestly
+- Keep responses focused and concise while being thorough"""
+
+# Split the template once at import so each request only joins strings
+_PROMPT_HEAD, _rest = SYSTEM_PROMPT.split("{context}")
+_PROMPT_AFTER_CONTEXT, _rest = _rest.split("{current_time}")
+_PROMPT_AFTER_TIME, _PROMPT_TAIL = _rest.split("{video_title}")
+del _rest
+
+
+def build_system_prompt(context: str, current_time: str, video_title: str) -> str:
+    """Fill SYSTEM_PROMPT; equivalent to SYSTEM_PROMPT.format(...)."""
+    return "".join((
+        _PROMPT_HEAD, context,
+        _PROMPT_AFTER_CONTEXT, current_time,
+        _PROMPT_AFTER_TIME, video_title,
+        _PROMPT_TAIL,
+    ))
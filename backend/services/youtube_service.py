@@ -1,188 +1,303 @@
+import os
+import asyncio
+import functools
 import re
+import threading
+import time
+import httpx
+import numpy as np
+import orjson
 import yt_dlp
-from typing import Optional
+from diskcache import Cache
+from numba import njit
+from collections import OrderedDict
+from typing import Iterable, Iterator, Optional
 import logging
 
+from services.http_client import get_http_client
+
 logger = logging.getLogger(__name__)
 
+YOUTUBE_CACHE_PATH = os.getenv("YOUTUBE_CACHE_PATH", "./data/youtube_cache")
+
+YDL_OPTS = {
+    'quiet': True,
+    'no_warnings': True,
+    'extract_flat': False,
+    'writesubtitles': True,
+    'writeautomaticsub': True,
+    'subtitleslangs': ['en'],
+    # Only json3 is parsed; yt-dlp falls back to another format if it is missing
+    'subtitlesformat': 'json3',
+    'skip_download': True,
+}
+
+# Recently fetched video info, keyed by YouTube ID. Entries expire well
+# before the signed subtitle URLs they hold (valid for several hours).
+INFO_CACHE_TTL = 60 * 60
+INFO_CACHE_SIZE = 256
+_info_cache: "OrderedDict[str, tuple[float, dict]]" = OrderedDict()
+_info_cache_lock = threading.Lock()
+
+# Holds each worker thread's YoutubeDL instance
+_thread_local = threading.local()
+
+# Extracted video data is reused for a day before YouTube is asked again
+VIDEO_CACHE_TTL = 24 * 60 * 60
+
+# Matches watch, youtu.be, embed, shorts and legacy /e/ and /v/ URLs in one scan
+_YOUTUBE_ID_RE = re.compile(
+    r'(?:youtube\.com/(?:watch\?v=|embed/|shorts/|e/|v/)|youtu\.be/)([^&\n?#]+)'
+)
+
 
 def extract_youtube_id(url: str) -> Optional[str]:
     """Extract YouTube video ID from various URL formats."""
-    patterns = [
-        r'(?:youtube\.com\/watch\?v=|youtu\.be\/|youtube\.com\/embed\/)([^&\n?#]+)',
-        r'youtube\.com\/shorts\/([^&\n?#]+)',
-    ]
-    for pattern in patterns:
-        match = re.search(pattern, url)
-        if match:
-            return match.group(1)
-    return None
-
-
-def chunk_transcript(transcript: list[dict], target_tokens: int = 600) -> list[dict]:
+    match = _YOUTUBE_ID_RE.search(url)
+    return match.group(1) if match else None
+
+
+@njit("int64[:](int64[:], int64)", cache=True)
+def _chunk_bounds(cumulative: np.ndarray, word_limit: int) -> np.ndarray:
+    """Return the end index of each chunk for a greedy split.
+
+    cumulative holds the running word count after each segment. A chunk
+    grows while its word count stays within word_limit and always holds at
+    least one segment.
+    """
+    bounds = np.empty(len(cumulative), dtype=np.int64)
+    count = 0
+    lo = 0
+    base = 0
+    while lo < len(cumulative):
+        hi = max(lo + 1, np.searchsorted(cumulative, base + word_limit, side="right"))
+        bounds[count] = hi
+        count += 1
+        base = cumulative[hi - 1]
+        lo = hi
+    return bounds[:count]
+
+
+def chunk_transcript(transcript: Iterable[dict], target_tokens: int = 600) -> list[dict]:
     """
     Chunk transcript into segments of approximately target_tokens.
     Each chunk includes start_time, end_time, and text.
-    """
-    chunks = []
-    current_chunk = {
-        "text": "",
-        "start_time": 0,
-        "end_time": 0
-    }
-    current_tokens = 0
 
+    transcript is iterated once, so it may be a generator.
+    """
+    # Read each segment's fields once into parallel lists
+    texts = []
+    word_counts = []
+    starts = []
+    ends = []
     for segment in transcript:
         text = segment.get("text", "").strip()
         if not text:
             continue
+        start = segment.get("start", 0)
+        texts.append(text)
+        word_counts.append(len(text.split()))
+        starts.append(start)
+        ends.append(start + segment.get("duration", 0))
 
-        # Rough token estimate (words * 1.3)
-        segment_tokens = len(text.split()) * 1.3
-
-        if current_tokens == 0:
-            current_chunk["start_time"] = segment.get("start", 0)
-
-        if current_tokens + segment_tokens > target_tokens and current_tokens > 0:
-            # Save current chunk and start new one
-            current_chunk["text"] = current_chunk["text"].strip()
-            chunks.append(current_chunk)
-            current_chunk = {
-                "text": text + " ",
-                "start_time": segment.get("start", 0),
-                "end_time": segment.get("start", 0) + segment.get("duration", 0)
-            }
-            current_tokens = segment_tokens
-        else:
-            current_chunk["text"] += text + " "
-            current_chunk["end_time"] = segment.get("start", 0) + segment.get("duration", 0)
-            current_tokens += segment_tokens
+    if not texts:
+        return []
 
-    # Don't forget the last chunk
-    if current_chunk["text"].strip():
-        current_chunk["text"] = current_chunk["text"].strip()
-        chunks.append(current_chunk)
+    # Rough token estimate is words * 1.3, so a chunk fits while
+    # words * 13 <= target_tokens * 10. Keeping the sums in integers avoids
+    # float rounding when a chunk lands exactly on the target.
+    word_limit = int(target_tokens * 10) // 13
+    cumulative = np.cumsum(np.array(word_counts, dtype=np.int64))
+
+    chunks = []
+    lo = 0
+    for hi in _chunk_bounds(cumulative, word_limit).tolist():
+        chunks.append({
+            "text": " ".join(texts[lo:hi]),
+            "start_time": starts[lo],
+            "end_time": ends[hi - 1]
+        })
+        lo = hi
 
     return chunks
 
 
+def _iter_segments(events: list[dict]) -> Iterator[dict]:
+    """Yield transcript segments from json3 subtitle events."""
+    for event in events:
+        if 'segs' in event:
+            text = ''.join([seg['utf8'] for seg in event['segs'] if 'utf8' in seg])
+            if text.strip():
+                yield {
+                    "text": text,
+                    "start": event.get('tStartMs', 0) / 1000,
+                    "duration": event.get('dDurationMs', 0) / 1000
+                }
+
+
+def get_youtube_dl() -> yt_dlp.YoutubeDL:
+    """Get the calling thread's long-lived yt-dlp instance.
+
+    YoutubeDL keeps per-run mutable state and is not thread-safe, so each
+    worker thread running extractions reuses its own instance.
+    """
+    youtube_dl = getattr(_thread_local, "youtube_dl", None)
+    if youtube_dl is None:
+        youtube_dl = _thread_local.youtube_dl = yt_dlp.YoutubeDL(YDL_OPTS)
+    return youtube_dl
+
+
+@functools.lru_cache(maxsize=1)
+def get_cache() -> Cache:
+    """Get the on-disk cache of extracted video data."""
+    return Cache(YOUTUBE_CACHE_PATH)
+
+
 async def extract_video_data(url: str) -> Optional[dict]:
     """
     Extract video metadata and transcript from YouTube URL.
     Returns dict with youtube_id, title, duration, transcript (full text), and chunks.
+
+    Results are cached on disk by YouTube ID for VIDEO_CACHE_TTL seconds;
+    failed extractions are not cached.
     """
     youtube_id = extract_youtube_id(url)
     if not youtube_id:
         logger.error(f"Could not extract YouTube ID from URL: {url}")
         return None
 
-    ydl_opts = {
-        'quiet': True,
-        'no_warnings': True,
-        'extract_flat': False,
-        'writesubtitles': True,
-        'writeautomaticsub': True,
-        'subtitleslangs': ['en'],
-        'skip_download': True,
+    cache = get_cache()
+    video_data = await asyncio.to_thread(cache.get, youtube_id)
+    if video_data is not None:
+        return video_data
+
+    video_data = await _fetch_video_data(youtube_id)
+    if video_data is not None:
+        await asyncio.to_thread(cache.set, youtube_id, video_data, expire=VIDEO_CACHE_TTL)
+    return video_data
+
+
+async def extract_video_data_batch(
+    urls: list[str],
+    concurrency: int = 8
+) -> list[Optional[dict]]:
+    """
+    Extract video data for several URLs concurrently.
+    Results line up with urls; at most concurrency extractions run at once.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def extract_one(url: str) -> Optional[dict]:
+        async with semaphore:
+            return await extract_video_data(url)
+
+    return await asyncio.gather(*(extract_one(url) for url in urls))
+
+
+def _fetch_info(youtube_id: str) -> dict:
+    """Fetch the title, duration and subtitle track of a video.
+
+    Results are remembered for INFO_CACHE_TTL seconds. Failed extractions
+    raise, so they are never cached.
+    """
+    now = time.monotonic()
+    with _info_cache_lock:
+        cached = _info_cache.get(youtube_id)
+        if cached is not None and cached[0] > now:
+            _info_cache.move_to_end(youtube_id)
+            return cached[1]
+
+    url = f"https://www.youtube.com/watch?v={youtube_id}"
+    info = get_youtube_dl().extract_info(url, download=False)
+    if info is None:
+        raise ValueError(f"yt-dlp returned no info for video {youtube_id}")
+
+    # yt-dlp resolves the requested track during extraction, preferring
+    # manual subtitles over auto-generated captions
+    requested_subtitles = info.get('requested_subtitles') or {}
+    video_info = {
+        "title": info.get('title', 'Unknown Title'),
+        "duration": info.get('duration', 0),
+        "subtitle_track": requested_subtitles.get('en'),
     }
 
-    try:
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            info = ydl.extract_info(url, download=False)
+    with _info_cache_lock:
+        _info_cache[youtube_id] = (now + INFO_CACHE_TTL, video_info)
+        _info_cache.move_to_end(youtube_id)
+        if len(_info_cache) > INFO_CACHE_SIZE:
+            _info_cache.popitem(last=False)
+    return video_info
 
-            title = info.get('title', 'Unknown Title')
-            duration = info.get('duration', 0)
 
-            # Try to get subtitles/captions
-            subtitles = info.get('subtitles', {})
-            auto_captions = info.get('automatic_captions', {})
+def _forget_info(youtube_id: str) -> None:
+    """Drop a video's cached info, e.g. after its subtitle URL failed."""
+    with _info_cache_lock:
+        _info_cache.pop(youtube_id, None)
+
+
+async def _fetch_video_data(youtube_id: str) -> Optional[dict]:
+    """Extract video data from YouTube, bypassing the on-disk cache."""
+    try:
+        info = await asyncio.to_thread(_fetch_info, youtube_id)
 
+        title = info["title"]
+        duration = info["duration"]
+
+        transcript_data = info["subtitle_track"]
+        if transcript_data and transcript_data.get('ext') != 'json3':
             transcript_data = None
 
-            # Prefer manual subtitles over auto-generated
-            if 'en' in subtitles:
-                for sub in subtitles['en']:
-                    if sub.get('ext') == 'json3':
-                        transcript_data = sub
-                        break
-            elif 'en' in auto_captions:
-                for sub in auto_captions['en']:
-                    if sub.get('ext') == 'json3':
-                        transcript_data = sub
-                        break
-
-            # If no json3, try to get any available format
-            if not transcript_data:
-                # Fall back to extracting from the video directly
-                ydl_opts_transcript = {
-                    'quiet': True,
-                    'no_warnings': True,
-                    'skip_download': True,
-                    'writesubtitles': True,
-                    'writeautomaticsub': True,
-                    'subtitlesformat': 'json3',
-                    'subtitleslangs': ['en'],
-                    'outtmpl': '/tmp/%(id)s',
-                }
+        if not transcript_data:
+            # No usable English track; try youtube-transcript-api as fallback
+            try:
+                from youtube_transcript_api import YouTubeTranscriptApi
+                transcript_list = await asyncio.to_thread(
+                    YouTubeTranscriptApi.get_transcript, youtube_id
+                )
+                transcript_segments = [
+                    {
+                        "text": seg["text"],
+                        "start": seg["start"],
+                        "duration": seg["duration"]
+                    }
+                    for seg in transcript_list
+                ]
+            except ImportError:
+                logger.warning("youtube-transcript-api not installed, using yt-dlp only")
+                transcript_segments = []
+            except Exception as e:
+                logger.warning(f"Failed to get transcript via youtube-transcript-api: {e}")
+                transcript_segments = []
+
+            if not transcript_segments:
+                # Create a simple transcript from video chapters or description
+                logger.warning(f"No transcript available for video {youtube_id}")
+                return None
+        else:
+            # Parse json3 format from yt-dlp
+            sub_url = transcript_data.get('url')
+            if sub_url:
+                response = await get_http_client(httpx.AsyncClient).get(sub_url)
+                response.raise_for_status()
+                sub_data = orjson.loads(response.content)
+                transcript_segments = _iter_segments(sub_data.get('events', []))
+
+        # Chunk the transcript
+        chunks = chunk_transcript(transcript_segments)
+
+        # Build full transcript text from the already-joined chunk texts
+        full_transcript = ' '.join([chunk["text"] for chunk in chunks])
 
-                # Try using youtube-transcript-api as fallback
-                try:
-                    from youtube_transcript_api import YouTubeTranscriptApi
-                    transcript_list = YouTubeTranscriptApi.get_transcript(youtube_id)
-                    transcript_segments = [
-                        {
-                            "text": seg["text"],
-                            "start": seg["start"],
-                            "duration": seg["duration"]
-                        }
-                        for seg in transcript_list
-                    ]
-                except ImportError:
-                    logger.warning("youtube-transcript-api not installed, using yt-dlp only")
-                    transcript_segments = []
-                except Exception as e:
-                    logger.warning(f"Failed to get transcript via youtube-transcript-api: {e}")
-                    transcript_segments = []
-
-                if not transcript_segments:
-                    # Create a simple transcript from video chapters or description
-                    logger.warning(f"No transcript available for video {youtube_id}")
-                    return None
-            else:
-                # Parse json3 format from yt-dlp
-                import urllib.request
-                import json
-
-                sub_url = transcript_data.get('url')
-                if sub_url:
-                    with urllib.request.urlopen(sub_url) as response:
-                        sub_data = json.loads(response.read().decode())
-                        events = sub_data.get('events', [])
-                        transcript_segments = []
-                        for event in events:
-                            if 'segs' in event:
-                                text = ''.join(seg.get('utf8', '') for seg in event['segs'])
-                                if text.strip():
-                                    transcript_segments.append({
-                                        "text": text,
-                                        "start": event.get('tStartMs', 0) / 1000,
-                                        "duration": event.get('dDurationMs', 0) / 1000
-                                    })
-
-            # Build full transcript text
-            full_transcript = ' '.join(seg['text'] for seg in transcript_segments)
-
-            # Chunk the transcript
-            chunks = chunk_transcript(transcript_segments)
-
-            return {
-                "youtube_id": youtube_id,
-                "title": title,
-                "duration": duration,
-                "transcript": full_transcript,
-                "chunks": chunks
-            }
+        return {
+            "youtube_id": youtube_id,
+            "title": title,
+            "duration": duration,
+            "transcript": full_transcript,
+            "chunks": chunks
+        }
 
     except Exception as e:
+        # The cached subtitle URL may have expired; fetch fresh info next time
+        _forget_info(youtube_id)
         logger.error(f"Error extracting video data: {e}")
         return None
@@ -15,6 +15,7 @@ test_db_path = Path(__file__).parent / "test_database.db"
 # Set test environment variables
 os.environ["DATABASE_PATH"] = str(test_db_path)
 os.environ["CHROMA_PATH"] = "./test_data/chroma_db"
+os.environ["YOUTUBE_CACHE_PATH"] = "./test_data/youtube_cache"
 os.environ["LLM_PROVIDER"] = "openai"
 os.environ["OPENAI_API_KEY"] = "test-key"
 
@@ -14,7 +14,8 @@ def client():
     from fastapi.testclient import TestClient
     from main import app
 
-    return TestClient(app)
+    with TestClient(app) as client:
+        yield client
 
 
 class TestHealthEndpoint:
@@ -42,6 +43,248 @@ class TestVideoEndpoints:
         assert "not found" in response.json()["detail"].lower()
 
 
+class TestVideoIndexing:
+    """Test background indexing of loaded videos."""
+
+    @pytest.fixture
+    def failing_indexing(self, monkeypatch, test_video_data):
+        """Extract fixed video data and make embedding generation fail."""
+        import services.embedding_service
+        import services.youtube_service
+
+        async def extract_video_data(url):
+            return {**test_video_data, "youtube_id": "indexing_test"}
+
+        async def embed_chunks(video_id, chunks, pool=None):
+            raise RuntimeError("embedding API unavailable")
+
+        monkeypatch.setattr(services.youtube_service, "extract_video_data", extract_video_data)
+        monkeypatch.setattr(services.embedding_service, "embed_chunks", embed_chunks)
+
+    @pytest.fixture
+    def working_indexing(self, monkeypatch):
+        """Make embedding generation and vector storage succeed."""
+        import services.embedding_service
+        import vector_store.chroma_manager
+
+        async def embed_chunks(video_id, chunks, pool=None):
+            return [[0.1] * 3 for _ in chunks]
+
+        async def store_chunks(video_id, chunks, embeddings):
+            pass
+
+        monkeypatch.setattr(services.embedding_service, "embed_chunks", embed_chunks)
+        monkeypatch.setattr(vector_store.chroma_manager, "store_chunks", store_chunks)
+
+    def test_load_returns_accepted_while_indexing(self, client, failing_indexing):
+        response = client.post("/api/video/load", json={"url": "https://youtu.be/indexing_test"})
+        assert response.status_code == 202
+        assert response.json()["status"] == "indexing"
+        assert response.json()["chunk_count"] == 2
+
+    def test_failed_indexing_is_reported(self, client, failing_indexing):
+        client.post("/api/video/load", json={"url": "https://youtu.be/indexing_test"})
+
+        status = client.get("/api/video/indexing_test/status")
+        assert status.json() == {"id": "indexing_test", "status": "failed"}
+        assert client.get("/api/video/indexing_test").json()["status"] == "failed"
+
+        response = client.post(
+            "/api/chat/message",
+            json={"video_id": "indexing_test", "message": "What is this about?"}
+        )
+        assert response.status_code == 409
+        assert response.json()["detail"] == "Video indexing failed"
+
+    def test_retry_recovers_failed_indexing(self, client, failing_indexing, request):
+        client.post("/api/video/load", json={"url": "https://youtu.be/indexing_test"})
+        assert client.get("/api/video/indexing_test/status").json()["status"] == "failed"
+
+        # Embedding generation works again
+        request.getfixturevalue("working_indexing")
+        response = client.post("/api/video/indexing_test/index")
+        assert response.status_code == 202
+        assert client.get("/api/video/indexing_test/status").json()["status"] == "ready"
+
+        assert client.post("/api/video/indexing_test/index").status_code == 200
+
+    def test_status_resumes_lost_indexing(self, client, working_indexing, test_video_data):
+        from main import app
+
+        async def add_unindexed_video():
+            async with app.state.db_pool.connection() as db:
+                await db.execute(
+                    """INSERT INTO videos (id, youtube_id, title, duration, transcript)
+                       VALUES ('lost_task_test', 'lost_task_test', 'Lost', 60, '')"""
+                )
+                await db.executemany(
+                    """INSERT INTO chunks (video_id, chunk_index, start_time, end_time, text)
+                       VALUES ('lost_task_test', ?, ?, ?, ?)""",
+                    [(i, c["start_time"], c["end_time"], c["text"])
+                     for i, c in enumerate(test_video_data["chunks"])]
+                )
+                await db.commit()
+
+        client.portal.call(add_unindexed_video)
+
+        assert client.get("/api/video/lost_task_test/status").json()["status"] == "indexing"
+        assert client.get("/api/video/lost_task_test/status").json()["status"] == "ready"
+
+    def test_status_not_found(self, client):
+        response = client.get("/api/video/nonexistent_id/status")
+        assert response.status_code == 404
+
+
+class TestChatStream:
+    """Test streaming chat responses as Server-Sent Events."""
+
+    @pytest.fixture
+    def retrieval(self, monkeypatch):
+        """Skip embedding the question and querying the vector DB."""
+        import services.embedding_service
+        import vector_store.chroma_manager
+
+        async def embed_text(text, pool=None):
+            return [0.1] * 3
+
+        async def query_similar_chunks(video_id, embedding, n_results=5):
+            return [{"text": "Relevant chunk", "start_time": 0.0, "end_time": 5.0,
+                     "chunk_index": 0}]
+
+        monkeypatch.setattr(services.embedding_service, "embed_text", embed_text)
+        monkeypatch.setattr(vector_store.chroma_manager, "query_similar_chunks", query_similar_chunks)
+
+    @staticmethod
+    def stub_provider(monkeypatch, fake_stream):
+        import services.llm_service
+
+        monkeypatch.setattr(services.llm_service, "stream_chat_response", fake_stream)
+
+    @staticmethod
+    def parse_events(body):
+        """Split an SSE body into (event, data) pairs."""
+        import orjson
+
+        events = []
+        for frame in body.strip().split("\n\n"):
+            fields = dict(line.split(": ", 1) for line in frame.split("\n"))
+            events.append((fields.get("event", "message"), orjson.loads(fields["data"])))
+        return events
+
+    def test_stream_sends_chunks_then_done(self, client, monkeypatch, retrieval):
+        from main import app
+
+        stored_mid_stream = []
+
+        async def count_messages():
+            async with app.state.db_pool.connection() as db:
+                cursor = await db.execute(
+                    "SELECT COUNT(*) FROM messages WHERE video_id = 'stream_test'"
+                )
+                return (await cursor.fetchone())[0]
+
+        async def fake_stream(question, context_chunks, video_title, current_timestamp=0.0):
+            yield "Hello, "
+            stored_mid_stream.append(await count_messages())
+            yield "world"
+
+        self.stub_provider(monkeypatch, fake_stream)
+
+        response = client.post(
+            "/api/chat/stream",
+            json={"video_id": "stream_test", "message": "Hi?"}
+        )
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/event-stream")
+
+        events = self.parse_events(response.text)
+        assert events[:2] == [("message", {"content": "Hello, "}),
+                              ("message", {"content": "world"})]
+        assert events[2][0] == "done"
+        assert events[2][1]["context_chunks"][0]["text"] == "Relevant chunk"
+
+        assert stored_mid_stream == [0]
+        history = client.get("/api/chat/history/stream_test").json()
+        assert [(m["role"], m["content"]) for m in history] == [
+            ("user", "Hi?"), ("assistant", "Hello, world")
+        ]
+
+    def test_provider_error_before_streaming_returns_500(self, client, monkeypatch, retrieval):
+        async def fake_stream(question, context_chunks, video_title, current_timestamp=0.0):
+            raise RuntimeError("missing API key")
+            yield
+
+        self.stub_provider(monkeypatch, fake_stream)
+
+        response = client.post(
+            "/api/chat/stream",
+            json={"video_id": "stream_error_test", "message": "Hi?"}
+        )
+        assert response.status_code == 500
+        assert response.json()["detail"] == "LLM API error"
+        assert client.get("/api/chat/history/stream_error_test").json() == []
+
+    def test_provider_error_mid_stream_sends_error_event(self, client, monkeypatch, retrieval):
+        async def fake_stream(question, context_chunks, video_title, current_timestamp=0.0):
+            yield "Partial"
+            raise RuntimeError("connection reset")
+
+        self.stub_provider(monkeypatch, fake_stream)
+
+        response = client.post(
+            "/api/chat/stream",
+            json={"video_id": "stream_broken_test", "message": "Hi?"}
+        )
+        assert response.status_code == 200
+        assert self.parse_events(response.text) == [
+            ("message", {"content": "Partial"}),
+            ("error", {"detail": "LLM API error"}),
+        ]
+        assert client.get("/api/chat/history/stream_broken_test").json() == []
+
+
+class TestChatHistory:
+    """Test fetching the recent chat history window."""
+
+    def test_fetch_recent_messages_returns_last_oldest_first(self, client):
+        from main import app, fetch_recent_messages
+
+        async def add_messages():
+            async with app.state.db_pool.connection() as db:
+                await db.executemany(
+                    """INSERT INTO messages (video_id, role, content)
+                       VALUES ('history_test', ?, ?)""",
+                    [("user" if i % 2 == 0 else "assistant", f"message {i}") for i in range(5)]
+                )
+                await db.commit()
+
+        client.portal.call(add_messages)
+        history = client.portal.call(fetch_recent_messages, "history_test", 3)
+
+        assert [m["content"] for m in history] == ["message 2", "message 3", "message 4"]
+
+    def test_history_endpoint_limit(self, client):
+        from main import app
+
+        async def add_messages():
+            async with app.state.db_pool.connection() as db:
+                await db.executemany(
+                    """INSERT INTO messages (video_id, role, content)
+                       VALUES ('history_limit_test', 'user', ?)""",
+                    [(f"message {i}",) for i in range(4)]
+                )
+                await db.commit()
+
+        client.portal.call(add_messages)
+
+        response = client.get("/api/chat/history/history_limit_test", params={"limit": 2})
+        assert response.status_code == 200
+        assert [m["content"] for m in response.json()] == ["message 2", "message 3"]
+
+        full = client.get("/api/chat/history/history_limit_test").json()
+        assert len(full) == 4
+
+
 class TestNotesEndpoints:
     """Test notes CRUD endpoints."""
 
@@ -89,6 +332,27 @@ class TestNotesEndpoints:
         assert isinstance(notes, list)
         assert len(notes) > 0
 
+    def test_get_notes_filtered_by_tag(self, client):
+        """Test retrieving only the notes carrying a tag."""
+        video_id = "tag_filter_video"
+        tagged = client.post("/api/notes", json={
+            "video_id": video_id,
+            "timestamp": 20.0,
+            "content": "Tagged note",
+            "tags": ["review"]
+        }).json()
+        retagged = client.post("/api/notes", json={
+            "video_id": video_id,
+            "timestamp": 30.0,
+            "content": "Retagged note",
+            "tags": ["review"]
+        }).json()
+        client.put(f"/api/notes/{retagged['id']}", json={"tags": ["done"]})
+
+        response = client.get(f"/api/notes/{video_id}", params={"tag": "review"})
+        assert response.status_code == 200
+        assert [n["id"] for n in response.json()] == [tagged["id"]]
+
     def test_update_note(self, client, mock_video_id):
         """Test updating a note."""
         # Create a note
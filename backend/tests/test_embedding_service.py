@@ -0,0 +1,81 @@
+"""Tests for embedding service caching."""
+import numpy as np
+import pytest
+from types import SimpleNamespace
+
+import services.embedding_service as embedding_service
+from models.database import create_pool
+
+
+def raw_embedding(text):
+    return [float(len(text)), 1.0, 2.0]
+
+
+def unit(values):
+    values = np.asarray(values, dtype=np.float32)
+    return values / np.linalg.norm(values)
+
+
+class FakeEmbeddings:
+    """Stand-in for the OpenAI embeddings API that records requests."""
+
+    def __init__(self):
+        self.requests = []
+
+    async def create(self, model, input):
+        texts = [input] if isinstance(input, str) else input
+        self.requests.append(texts)
+        return SimpleNamespace(data=[
+            SimpleNamespace(embedding=raw_embedding(text))
+            for text in texts
+        ])
+
+
+@pytest.fixture
+def fake_api(monkeypatch):
+    embeddings = FakeEmbeddings()
+    monkeypatch.setattr(
+        embedding_service, "get_client", lambda: SimpleNamespace(embeddings=embeddings)
+    )
+    monkeypatch.setattr(embedding_service, "_memory_cache", embedding_service.OrderedDict())
+    return embeddings
+
+
+class TestEmbeddingCache:
+    """Test in-process and persistent embedding caching."""
+
+    async def test_embed_text_uses_memory_cache(self, fake_api):
+        first = await embedding_service.embed_text("What is attention?")
+        second = await embedding_service.embed_text("  what is ATTENTION?  ")
+
+        assert len(fake_api.requests) == 1
+        assert (first == second).all()
+
+    async def test_embed_texts_only_requests_misses(self, fake_api):
+        await embedding_service.embed_text("cached")
+        embeddings = await embedding_service.embed_texts(["cached", "fresh", "fresh"])
+
+        assert fake_api.requests[-1] == ["fresh"]
+        for embedding, text in zip(embeddings, ["cached", "fresh", "fresh"]):
+            assert np.allclose(embedding, unit(raw_embedding(text)))
+
+    async def test_embed_text_uses_persistent_cache(self, fake_api):
+        pool = create_pool()
+        try:
+            await embedding_service.embed_text("persisted question", pool)
+            embedding_service._memory_cache.clear()
+            embedding = await embedding_service.embed_text("persisted question", pool)
+        finally:
+            await pool.close()
+
+        assert len(fake_api.requests) == 1
+        assert np.allclose(embedding, unit(raw_embedding("persisted question")))
+
+    async def test_embed_chunks_returns_normalized_float16_array(self, fake_api):
+        chunks = [{"text": "first chunk"}, {"text": "second"}]
+        embeddings = await embedding_service.embed_chunks("video", chunks)
+
+        assert embeddings.shape == (2, 3)
+        assert embeddings.dtype == np.float16
+        assert np.allclose(np.linalg.norm(embeddings, axis=1), 1.0, atol=1e-3)
+        assert "embedding" not in chunks[0]
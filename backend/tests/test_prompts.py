@@ -0,0 +1,42 @@
+"""Tests for shared prompt construction."""
+from services.prompts import (
+    SYSTEM_PROMPT,
+    build_context_text,
+    build_system_prompt,
+    format_timestamp,
+)
+
+
+class TestFormatTimestamp:
+    """Test timestamp formatting."""
+
+    def test_under_a_minute(self):
+        assert format_timestamp(7.9) == "0:07"
+
+    def test_minutes(self):
+        assert format_timestamp(323.5) == "5:23"
+
+    def test_hours(self):
+        assert format_timestamp(3723) == "1:02:03"
+
+
+class TestBuildContextText:
+    """Test context text formatting."""
+
+    def test_empty_chunks(self):
+        assert build_context_text([]) == "No relevant transcript context available."
+
+    def test_chunks_with_timestamps(self, test_chunks):
+        assert build_context_text(test_chunks) == (
+            "[0:00 - 0:05]\nFirst chunk of transcript\n\n"
+            "[0:05 - 0:10]\nSecond chunk of transcript"
+        )
+
+
+class TestBuildSystemPrompt:
+    """Test system prompt construction."""
+
+    def test_matches_template_format(self):
+        assert build_system_prompt("Some {context}", "1:00", "Lecture") == SYSTEM_PROMPT.format(
+            context="Some {context}", current_time="1:00", video_title="Lecture"
+        )
@@ -1,5 +1,15 @@
 """Tests for YouTube service."""
+import asyncio
+import httpx
+import numpy as np
+import numba
+import orjson
 import pytest
+import threading
+from types import SimpleNamespace
+from diskcache import Cache
+
+import services.youtube_service as youtube_service
 from services.youtube_service import (
     extract_youtube_id,
     chunk_transcript,
@@ -29,6 +39,14 @@ class TestExtractYoutubeId:
         url = "https://www.youtube.com/watch?v=dQw4w9WgXcQ&t=42s"
         assert extract_youtube_id(url) == "dQw4w9WgXcQ"
 
+    def test_url_with_fragment(self):
+        url = "https://www.youtube.com/watch?v=dQw4w9WgXcQ#t=42"
+        assert extract_youtube_id(url) == "dQw4w9WgXcQ"
+
+    def test_short_url_with_parameters(self):
+        url = "https://youtu.be/dQw4w9WgXcQ?t=42"
+        assert extract_youtube_id(url) == "dQw4w9WgXcQ"
+
     def test_invalid_url(self):
         url = "https://www.example.com"
         assert extract_youtube_id(url) is None
@@ -68,6 +86,20 @@ class TestChunkTranscript:
             # Allow 50% tolerance
             assert word_count <= 100  # Not too large
 
+    def test_chunk_exactly_on_target_is_kept_together(self):
+        # 10 words estimate exactly 13 tokens, so they fit a 13-token chunk;
+        # an 11th word does not
+        transcript = [
+            {"text": " ".join(["word"] * 4), "start": 0, "duration": 1},
+            {"text": " ".join(["word"] * 6), "start": 1, "duration": 1},
+            {"text": "overflow", "start": 2, "duration": 1},
+        ]
+
+        chunks = chunk_transcript(transcript, target_tokens=13)
+
+        assert [len(chunk["text"].split()) for chunk in chunks] == [10, 1]
+        assert [(c["start_time"], c["end_time"]) for c in chunks] == [(0, 2), (2, 3)]
+
     def test_empty_transcript(self):
         chunks = chunk_transcript([])
         assert chunks == []
@@ -84,3 +116,176 @@ class TestChunkTranscript:
         # Verify timestamps are sequential
         for i in range(len(chunks) - 1):
             assert chunks[i]["end_time"] <= chunks[i + 1]["start_time"]
+
+
+class TestChunkBounds:
+    """Test the compiled chunk boundary search."""
+
+    def test_chunk_bounds_is_compiled(self):
+        assert youtube_service._chunk_bounds.signatures == [
+            (numba.types.int64[:], numba.types.int64)
+        ]
+
+    def test_compiled_matches_python(self):
+        rng = np.random.default_rng(0)
+        cumulative = np.cumsum(rng.integers(1, 40, size=2000)).astype(np.int64)
+
+        for word_limit in (1, 10, 46, 461):
+            compiled = youtube_service._chunk_bounds(cumulative, word_limit)
+            python = youtube_service._chunk_bounds.py_func(cumulative, word_limit)
+            assert compiled.tolist() == python.tolist()
+
+
+class TestExtractVideoDataCache:
+    """Test caching of extracted video data."""
+
+    @pytest.fixture
+    def fetches(self, monkeypatch, tmp_path, test_video_data):
+        """Use a temporary cache and record calls that reach YouTube."""
+        calls = []
+
+        async def fetch_video_data(youtube_id):
+            calls.append(youtube_id)
+            return test_video_data if youtube_id == "dQw4w9WgXcQ" else None
+
+        cache = Cache(str(tmp_path))
+        monkeypatch.setattr(youtube_service, "get_cache", lambda: cache)
+        monkeypatch.setattr(youtube_service, "_fetch_video_data", fetch_video_data)
+        yield calls
+        cache.close()
+
+    async def test_cache_hit_skips_extraction(self, fetches, test_video_data):
+        first = await youtube_service.extract_video_data("https://youtu.be/dQw4w9WgXcQ")
+        second = await youtube_service.extract_video_data(
+            "https://www.youtube.com/watch?v=dQw4w9WgXcQ&t=42s"
+        )
+
+        assert first == second == test_video_data
+        assert fetches == ["dQw4w9WgXcQ"]
+
+    async def test_failures_are_not_cached(self, fetches):
+        for _ in range(2):
+            assert await youtube_service.extract_video_data("https://youtu.be/unavailable") is None
+
+        assert fetches == ["unavailable", "unavailable"]
+
+
+class TestGetYoutubeDl:
+    """Test per-thread reuse of yt-dlp instances."""
+
+    def test_instance_reused_within_thread_not_shared_across(self, monkeypatch):
+        monkeypatch.setattr(youtube_service.yt_dlp, "YoutubeDL", lambda opts: object())
+        monkeypatch.setattr(youtube_service, "_thread_local", threading.local())
+
+        main_instance = youtube_service.get_youtube_dl()
+        other = {}
+        thread = threading.Thread(
+            target=lambda: other.setdefault("instance", youtube_service.get_youtube_dl())
+        )
+        thread.start()
+        thread.join()
+
+        assert youtube_service.get_youtube_dl() is main_instance
+        assert other["instance"] is not main_instance
+
+
+class TestFetchInfo:
+    """Test in-memory caching of yt-dlp info."""
+
+    @pytest.fixture
+    def extractions(self, monkeypatch):
+        """Replace yt-dlp with a stub that fails for unavailable videos.
+
+        Each extraction hands out a new signed subtitle URL.
+        """
+        calls = []
+
+        def extract_info(url, download=False):
+            calls.append(url)
+            if "unavailable" in url:
+                raise RuntimeError("Video unavailable")
+            return {
+                "title": "Test Video",
+                "duration": 10,
+                "formats": [{"format_id": "18"}],
+                "requested_subtitles": {
+                    "en": {"ext": "json3", "url": f"https://example.com/subs/{len(calls)}"}
+                },
+            }
+
+        monkeypatch.setattr(
+            youtube_service, "get_youtube_dl", lambda: SimpleNamespace(extract_info=extract_info)
+        )
+        monkeypatch.setattr(youtube_service, "_info_cache", youtube_service.OrderedDict())
+        return calls
+
+    def test_info_is_cached_by_id(self, extractions):
+        first = youtube_service._fetch_info("dQw4w9WgXcQ")
+        second = youtube_service._fetch_info("dQw4w9WgXcQ")
+
+        assert first is second
+        assert first == {
+            "title": "Test Video",
+            "duration": 10,
+            "subtitle_track": {"ext": "json3", "url": "https://example.com/subs/1"},
+        }
+        assert extractions == ["https://www.youtube.com/watch?v=dQw4w9WgXcQ"]
+
+    def test_expired_info_is_fetched_again(self, extractions, monkeypatch):
+        monkeypatch.setattr(youtube_service, "INFO_CACHE_TTL", 0)
+
+        youtube_service._fetch_info("dQw4w9WgXcQ")
+        youtube_service._fetch_info("dQw4w9WgXcQ")
+
+        assert len(extractions) == 2
+
+    def test_failures_are_not_cached(self, extractions):
+        for _ in range(2):
+            with pytest.raises(RuntimeError):
+                youtube_service._fetch_info("unavailable")
+
+        assert len(extractions) == 2
+
+    async def test_retry_after_failed_subtitle_fetch_uses_fresh_info(
+        self, extractions, monkeypatch
+    ):
+        def handler(request):
+            # The first signed URL has expired
+            if request.url.path == "/subs/1":
+                return httpx.Response(403)
+            events = [{"tStartMs": 0, "dDurationMs": 2000, "segs": [{"utf8": "Hello world"}]}]
+            return httpx.Response(200, content=orjson.dumps({"events": events}))
+
+        client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        monkeypatch.setattr(youtube_service, "get_http_client", lambda client_class: client)
+
+        assert await youtube_service._fetch_video_data("dQw4w9WgXcQ") is None
+        video_data = await youtube_service._fetch_video_data("dQw4w9WgXcQ")
+        await client.aclose()
+
+        assert len(extractions) == 2
+        assert video_data["transcript"] == "Hello world"
+
+
+class TestExtractVideoDataBatch:
+    """Test concurrent extraction of several videos."""
+
+    async def test_batch_preserves_order_and_limits_concurrency(self, monkeypatch):
+        running = 0
+        peak = 0
+
+        async def extract_video_data(url):
+            nonlocal running, peak
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.01)
+            running -= 1
+            return {"url": url}
+
+        monkeypatch.setattr(youtube_service, "extract_video_data", extract_video_data)
+
+        urls = [f"https://youtu.be/video{i}" for i in range(5)]
+        results = await youtube_service.extract_video_data_batch(urls, concurrency=2)
+
+        assert [r["url"] for r in results] == urls
+        assert peak == 2
@@ -1,59 +1,54 @@
 import os
+import functools
 import chromadb
-from typing import Optional
+import numpy as np
 import logging
 
 logger = logging.getLogger(__name__)
 
-_client: Optional[chromadb.ClientAPI] = None
-_collection = None
-
 CHROMA_PATH = os.getenv("CHROMA_PATH", "./data/chroma_db")
 
 
+@functools.lru_cache(maxsize=1)
 def get_client() -> chromadb.ClientAPI:
     """Get or create ChromaDB client."""
-    global _client
-    if _client is None:
-        os.makedirs(CHROMA_PATH, exist_ok=True)
-        _client = chromadb.PersistentClient(path=CHROMA_PATH)
-    return _client
+    os.makedirs(CHROMA_PATH, exist_ok=True)
+    return chromadb.PersistentClient(path=CHROMA_PATH)
 
 
+@functools.lru_cache(maxsize=1)
 def get_collection():
     """Get or create the transcript chunks collection."""
-    global _collection
-    if _collection is None:
-        client = get_client()
-        _collection = client.get_or_create_collection(
-            name="transcript_chunks",
-            metadata={"description": "Video transcript chunks with embeddings"}
-        )
-    return _collection
+    return get_client().get_or_create_collection(
+        name="transcript_chunks",
+        # Embeddings are unit-normalized, so inner product ranks like cosine
+        metadata={
+            "description": "Video transcript chunks with embeddings",
+            "hnsw:space": "ip"
+        }
+    )
 
 
-async def store_chunks(video_id: str, chunks: list[dict]) -> None:
-    """Store chunks with their embeddings in ChromaDB."""
+async def store_chunks(video_id: str, chunks: list[dict], embeddings: np.ndarray) -> None:
+    """Store chunks with their embeddings in ChromaDB.
+
+    embeddings is an (n_chunks, dim) array whose rows line up with chunks.
+    """
     collection = get_collection()
 
-    ids = []
-    documents = []
-    embeddings = []
-    metadatas = []
-
-    for i, chunk in enumerate(chunks):
-        chunk_id = f"{video_id}_{i}"
-        ids.append(chunk_id)
-        documents.append(chunk["text"])
-        embeddings.append(chunk.get("embedding", []))
-        metadatas.append({
+    ids = [f"{video_id}_{i}" for i in range(len(chunks))]
+    documents = [chunk["text"] for chunk in chunks]
+    metadatas = [
+        {
             "video_id": video_id,
             "chunk_index": i,
             "start_time": chunk["start_time"],
             "end_time": chunk["end_time"]
-        })
+        }
+        for i, chunk in enumerate(chunks)
+    ]
 
-    if embeddings and embeddings[0]:
+    if len(embeddings):
         collection.upsert(
             ids=ids,
             documents=documents,
@@ -80,30 +75,27 @@ async def query_similar_chunks(
         include=["documents", "metadatas", "distances"]
     )
 
-    chunks = []
-    if results["documents"] and results["documents"][0]:
-        for i, doc in enumerate(results["documents"][0]):
-            chunks.append({
-                "text": doc,
-                "chunk_index": results["metadatas"][0][i]["chunk_index"],
-                "start_time": results["metadatas"][0][i]["start_time"],
-                "end_time": results["metadatas"][0][i]["end_time"],
-                "distance": results["distances"][0][i] if results["distances"] else None
-            })
+    if not results["documents"] or not results["documents"][0]:
+        return []
+
+    documents = results["documents"][0]
+    metadatas = results["metadatas"][0]
+    distances = results["distances"][0] if results["distances"] else [None] * len(documents)
 
-    return chunks
+    return [
+        {
+            "text": document,
+            "chunk_index": metadata["chunk_index"],
+            "start_time": metadata["start_time"],
+            "end_time": metadata["end_time"],
+            "distance": distance
+        }
+        for document, metadata, distance in zip(documents, metadatas, distances)
+    ]
 
 
 async def delete_video_chunks(video_id: str) -> None:
     """Delete all chunks for a video."""
     collection = get_collection()
-
-    # Get all chunk IDs for this video
-    results = collection.get(
-        where={"video_id": video_id},
-        include=[]
-    )
-
-    if results["ids"]:
-        collection.delete(ids=results["ids"])
-        logger.info(f"Deleted {len(results['ids'])} chunks for video {video_id}")
+    collection.delete(where={"video_id": video_id})
+    logger.info(f"Deleted chunks for video {video_id}")
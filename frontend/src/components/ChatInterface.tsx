@@ -2,10 +2,21 @@ import { useState, useRef, useEffect } from 'react'
 import { Send, Loader2 } from 'lucide-react'
 import ReactMarkdown from 'react-markdown'
 import { useLearningStore } from '../store/learningStore'
-import { sendMessage, getChatHistory } from '../services/api'
+import {
+  sendMessage,
+  getChatHistory,
+  getVideoStatus,
+  retryIndexing,
+  isIndexingError,
+  type IndexingStatus,
+} from '../services/api'
+
+const INDEXING_POLL_MS = 2000
 
 export function ChatInterface() {
   const [input, setInput] = useState('')
+  const [indexingStatus, setIndexingStatus] = useState<IndexingStatus>('ready')
+  const isIndexing = indexingStatus !== 'ready'
   const messagesEndRef = useRef<HTMLDivElement>(null)
 
   const {
@@ -25,10 +36,26 @@ export function ChatInterface() {
     // Only load history once per video
     if (currentVideo && loadedVideoRef.current !== currentVideo.id) {
       loadedVideoRef.current = currentVideo.id
+      setIndexingStatus(currentVideo.status ?? 'ready')
       loadHistory()
     }
   }, [currentVideo?.id])
 
+  useEffect(() => {
+    // Poll until the backend has finished or given up indexing the transcript
+    if (!currentVideo || indexingStatus !== 'indexing') return
+    const videoId = currentVideo.id
+    const timer = setInterval(async () => {
+      try {
+        const { status } = await getVideoStatus(videoId)
+        setIndexingStatus(status)
+      } catch (err) {
+        console.error('Failed to check indexing status:', err)
+      }
+    }, INDEXING_POLL_MS)
+    return () => clearInterval(timer)
+  }, [currentVideo?.id, indexingStatus])
+
   useEffect(() => {
     scrollToBottom()
   }, [messages])
@@ -43,12 +70,23 @@ export function ChatInterface() {
     }
   }
 
+  const handleRetryIndexing = async () => {
+    if (!currentVideo) return
+    try {
+      const { status } = await retryIndexing(currentVideo.id)
+      setIndexingStatus(status)
+    } catch (err) {
+      setError('Failed to retry indexing. Is the backend running?')
+      console.error('Retry indexing error:', err)
+    }
+  }
+
   const scrollToBottom = () => {
     messagesEndRef.current?.scrollIntoView({ behavior: 'smooth' })
   }
 
   const handleSend = async () => {
-    if (!input.trim() || !currentVideo || isLoadingChat) return
+    if (!input.trim() || !currentVideo || isLoadingChat || isIndexing) return
 
     const userMessage = input.trim()
     setInput('')
@@ -61,8 +99,15 @@ export function ChatInterface() {
       const response = await sendMessage(currentVideo.id, userMessage, currentTimestamp)
       addMessage(response)
     } catch (err) {
-      setError('Failed to send message. Is the backend running?')
-      console.error('Chat error:', err)
+      if (isIndexingError(err)) {
+        // Not answered yet; restore the question and wait for indexing
+        setMessages(messages)
+        setInput(userMessage)
+        setIndexingStatus('indexing')
+      } else {
+        setError('Failed to send message. Is the backend running?')
+        console.error('Chat error:', err)
+      }
     } finally {
       setIsLoadingChat(false)
     }
@@ -93,7 +138,26 @@ export function ChatInterface() {
     <div className="flex flex-col h-full">
       {/* Messages */}
       <div className="flex-1 overflow-y-auto p-4 space-y-4">
-        {messages.length === 0 && (
+        {indexingStatus === 'indexing' && (
+          <div className="flex items-center justify-center gap-2 text-sm text-gray-400">
+            <Loader2 className="w-4 h-4 animate-spin text-blue-400" />
+            Indexing transcript… chat will be available shortly.
+          </div>
+        )}
+
+        {indexingStatus === 'failed' && (
+          <div className="flex items-center justify-center gap-2 text-sm text-gray-400">
+            Indexing the transcript failed.
+            <button
+              onClick={handleRetryIndexing}
+              className="text-blue-400 hover:text-blue-300 underline"
+            >
+              Retry
+            </button>
+          </div>
+        )}
+
+        {messages.length === 0 && !isIndexing && (
           <div className="text-center text-gray-500 mt-8">
             <p>Ask questions about the video content.</p>
             <p className="text-sm mt-2">The AI will use relevant transcript context to answer.</p>
@@ -151,14 +215,21 @@ export function ChatInterface() {
             value={input}
             onChange={(e) => setInput(e.target.value)}
             onKeyDown={handleKeyDown}
-            placeholder="Ask about the video..."
+            placeholder={
+              indexingStatus === 'indexing'
+                ? 'Indexing transcript…'
+                : indexingStatus === 'failed'
+                  ? 'Indexing failed'
+                  : 'Ask about the video...'
+            }
+            disabled={isIndexing}
             rows={1}
             className="flex-1 bg-gray-700 text-white rounded-lg px-4 py-2 resize-none focus:outline-none focus:ring-2 focus:ring-blue-500"
             style={{ minHeight: '40px', maxHeight: '120px' }}
           />
           <button
             onClick={handleSend}
-            disabled={!input.trim() || isLoadingChat}
+            disabled={!input.trim() || isLoadingChat || isIndexing}
             className="p-2 bg-blue-600 hover:bg-blue-700 disabled:bg-gray-600 disabled:cursor-not-allowed rounded-lg transition-colors"
           >
             <Send className="w-5 h-5 text-white" />
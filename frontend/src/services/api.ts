@@ -15,6 +15,14 @@ export interface Video {
   title: string
   duration: number
   chunk_count?: number
+  status?: IndexingStatus
+}
+
+export type IndexingStatus = 'indexing' | 'ready' | 'failed'
+
+export interface VideoStatus {
+  id: string
+  status: IndexingStatus
 }
 
 export interface ChatMessage {
@@ -48,6 +56,20 @@ export const getVideo = async (videoId: string): Promise<Video> => {
   return response.data
 }
 
+// Chat is available once the transcript embeddings have been indexed
+export const getVideoStatus = async (videoId: string): Promise<VideoStatus> => {
+  const response = await api.get(`/api/video/${videoId}/status`)
+  return response.data
+}
+
+export const retryIndexing = async (videoId: string): Promise<VideoStatus> => {
+  const response = await api.post(`/api/video/${videoId}/index`)
+  return response.data
+}
+
+export const isIndexingError = (err: unknown): boolean =>
+  axios.isAxiosError(err) && err.response?.status === 409
+
 export const listVideos = async (): Promise<Video[]> => {
   const response = await api.get('/api/videos')
   return response.data